@@ -1,4 +1,5 @@
 import math
+import random
 class Brain(object):
 
   # This goes along with Hawkins spatial pooling theory. i.e. Concepts are
@@ -23,7 +24,8 @@ class Brain(object):
   # parallelizable way.
   # LAYER_SLOWDOWN_RATIO = 0.5
 
-  def __init__(self, num_layers, neurons_in_leaf_layer):
+  def __init__(self, num_layers, neurons_in_leaf_layer, fovea=None,
+               store=None):
     """
     Build an empty brain
 
@@ -31,6 +33,11 @@ class Brain(object):
     num_layers -- Synonymous with layers of cortex.
       Hierarchical layers of brain. Should be less than six.
     neurons_in_leaf_layer -- Number of neurons in bottom layer of hierarchy.
+      Should be fovea.neurons when there is a fovea.
+    fovea -- Optional fovea.Fovea that samples each signal before it reaches
+      the leaf layer. Move its attention point with fovea.attend().
+    store -- Optional paging.RegionStore to keep connections out of
+      core, for brains larger than RAM.
     neurons_per_region -- Number of neurons that can form connections
       with each other within a layer.
       Since regions don't connect with other regions on the same layer,
@@ -39,6 +46,33 @@ class Brain(object):
     """
     self.num_layers = num_layers
     self.neurons_in_leaf_layer = neurons_in_leaf_layer
+    self.fovea = fovea
+    self.store = store
+
+    # Objects with an onFrame(brain) method, called after each perceive.
+    # e.g. tap.StateTap for watching a running brain.
+    self.observers = []
+
+    # Number of perceive calls so far. Layers memoize per frame against this.
+    self.frame = 0
+
+    # Whether the current perceive learns. See Layer.predictFromHistory.
+    self.learning = False
+
+    # Source of neurons' reinforcement learning draws. Replaced per layer by
+    # distributed.ShardWorker so shards draw the same numbers as one process.
+    self.random = random.random
+
+    # Set of neurons that learned since it was last emptied, or None when
+    # nothing is listening. See checkpoint.Checkpointer.
+    self.journal = None
+
+    # Tuple of every layer's LayerSnapshot from the last completed frame.
+    self.published = ()
+
+    # Readers wanting last_on and potential in snapshots, see subscribe().
+    self.subscribers = 0
+
     self.appendLayers()
     self.initConnections()
 
@@ -54,16 +88,30 @@ class Brain(object):
       num_neurons *= (self.LAYER_CONTRACTION_RATIO ** 2)
 
   def appendLayer(self, i, num_layers, num_neurons):
-    from layer import Layer
-    self.layers.append(Layer(num_neurons=num_neurons,
-                             layer_num=i,
-                             brain=self,
-                             is_top=(True if i == num_layers - 1 else False)))
+    self.layers.append(self.createLayer(
+      num_neurons=num_neurons,
+      layer_num=i,
+      brain=self,
+      is_top=(True if i == num_layers - 1 else False)))
     if i > 0:
       # Set child and parent layers
       self.layers[i - 1].parent = self.layers[i]
       self.layers[i].child = self.layers[i - 1]
 
+  def createLayer(self, **kwargs):
+    from layer import Layer
+    return Layer(**kwargs)
+
+  def createNeuron(self, **kwargs):
+    if self.store is not None:
+      return self.store.createNeuron(**kwargs)
+    from neuron import Neuron
+    return Neuron(**kwargs)
+
+  def createConnection(self, **kwargs):
+    from connection import Connection
+    return Connection(**kwargs)
+
   def initConnections(self):
     for layer in self.layers:
       # TODO, use nditer for speed (order doesn't matter).
@@ -74,14 +122,59 @@ class Brain(object):
     """Take a 2D array and feed it to the leaf layer. Then iterate it up the tree."""
     #TODO: Try to feed input to more than just leaf layer to simulate visual cortex.
     #TODO: Some neurons (color) are more sensitive than others allowing for increasing resolution with longer exposure.
-    #TODO: Cortical magnification for attention: http://en.wikipedia.org/wiki/Cortical_magnification
+    # Cortical magnification for attention, see fovea.Fovea.
+    if self.fovea is not None:
+      signal = self.fovea.sample(signal)
 
+    self.frame += 1
+    self.learning = learn
     for (layer_num, layer) in enumerate(self.layers):
+        if self.store is not None:
+          self.store.prefetch(layer)
         layer.predict()
         layer.observe(signal)
+        self.afterObserve(layer)
         if learn:
           layer.learn()
 
+    # Swap in the finished frame for readers, see snapshot().
+    self.published = tuple(layer.publish() for layer in self.layers)
+
+    for observer in self.observers:
+      observer.onFrame(self)
+
+  def afterObserve(self, layer):
+    """Called once layer has observed, before it learns. For subclasses."""
+    pass
+
+  def snapshot(self):
+    """
+    Return a LayerSnapshot per layer, all from the last completed frame.
+
+    Lock free and safe to call from other threads during perceive. This is
+    the only way to read a brain from another thread. Layer.predict and
+    Layer.state may run a frame's predictions on the calling thread.
+    """
+    return self.published
+
+  def subscribe(self):
+    """
+    Include last_on and potential in snapshots from the next frame on.
+    They cost a pass over every neuron per frame, so they are None unless
+    something has subscribed. Pair with unsubscribe().
+    """
+    self.subscribers += 1
+
+  def unsubscribe(self):
+    self.subscribers -= 1
+
+  def attach(self, observer):
+    """Call observer.onFrame(brain) at the end of every perceive."""
+    self.observers.append(observer)
+
+  def detach(self, observer):
+    self.observers.remove(observer)
+
   # No longer needed since prediction happens at neuron level.
   # def predict(self):
   #   """Returns 2D numpy array of bottom (leaf) layer prediction."""
@@ -0,0 +1,210 @@
+import cPickle
+import os
+import re
+
+import numpy
+
+
+# Connection groups of a neuron paired with their strong connection sets.
+GROUPS = (('sibling_connections', 'strong_sibling_connections'),
+          ('child_connections', 'strong_child_connections'),
+          ('parent_connections', 'strong_parent_connections'))
+
+CHECKPOINT_FILE = re.compile(r'^(base|delta)-(\d+)\.pkl$')
+
+
+class Checkpointer(object):
+  """
+  Incremental checkpoints of a running Brain.
+
+  On attach a base snapshot of every neuron's state and connections is
+  written. Then every `interval` frames a delta is written holding only the
+  connections of neurons that learned and the state of neurons whose
+  history changed since the previous checkpoint, so checkpoint I/O scales
+  with learning activity rather than brain size. Every DELTAS_PER_BASE deltas
+  a new base is written to bound the replay needed by restore().
+
+  Roll the brain back with Checkpointer.restore() to keep checkpointing
+  afterwards. It starts a new timeline from the restored frame.
+  """
+
+  # Deltas written before starting over with a new base snapshot.
+  DELTAS_PER_BASE = 100
+
+  def __init__(self, brain, directory, interval=1):
+    if brain.store is not None:
+      raise ValueError('Paged brains are kept in their RegionStore, see flush().')
+    self.brain = brain
+    self.directory = directory
+    self.interval = interval
+    if not os.path.isdir(directory):
+      os.makedirs(directory)
+    brain.journal = set()
+    brain.attach(self)
+    self.writeBase()
+
+  def onFrame(self, brain):
+    if brain.frame % self.interval:
+      return
+    if self.deltas_since_base >= self.DELTAS_PER_BASE:
+      self.writeBase()
+    else:
+      self.writeDelta()
+
+  def close(self):
+    self.brain.detach(self)
+    self.brain.journal = None
+
+  def restore(self, frame):
+    """
+    Roll the brain back to its latest checkpoint at or before frame and
+    continue checkpointing from there. Checkpoints after the restored frame
+    belong to the abandoned timeline and are deleted. Returns the restored
+    frame.
+    """
+    restored = restore(self.brain, self.directory, frame)
+    checkpoints = listCheckpoints(self.directory)
+    for (f, kind) in checkpoints:
+      if f > restored:
+        os.remove(checkpointPath(self.directory, kind, f))
+    base = max(f for (f, kind) in checkpoints
+               if kind == 'base' and f <= restored)
+    self.deltas_since_base = sum(1 for (f, kind) in checkpoints
+                                 if kind == 'delta' and base < f <= restored)
+    self.states = [layerStates(layer) for layer in self.brain.layers]
+    return restored
+
+  def writeBase(self):
+    brain = self.brain
+    neurons = {}
+    for layer in brain.layers:
+      for neuron in layer.neurons.flat:
+        neurons[neuron.coordinates()] = (neuronState(neuron),
+                                         neuronConnections(neuron))
+    self.write('base', neurons)
+    self.states = [layerStates(layer) for layer in brain.layers]
+    brain.journal.clear()
+    self.deltas_since_base = 0
+
+  def writeDelta(self):
+    brain = self.brain
+    neurons = {}
+    for neuron in brain.journal:
+      neurons[neuron.coordinates()] = (neuronState(neuron),
+                                       neuronConnections(neuron))
+
+    states = [layerStates(layer) for layer in brain.layers]
+    for (layer, old, new) in zip(brain.layers, self.states, states):
+      changed = (old != new).any(axis=2)
+      for (y, x) in zip(*changed.nonzero()):
+        neuron = layer.neurons[y, x]
+        if neuron.coordinates() not in neurons:
+          neurons[neuron.coordinates()] = (neuronState(neuron), None)
+    self.states = states
+
+    self.write('delta', neurons)
+    brain.journal.clear()
+    self.deltas_since_base += 1
+
+  def write(self, kind, neurons):
+    path = checkpointPath(self.directory, kind, self.brain.frame)
+    with open(path, 'wb') as out_file:
+      cPickle.dump(neurons, out_file, cPickle.HIGHEST_PROTOCOL)
+
+
+def restore(brain, directory, frame):
+  """
+  Roll brain back (or forward) to its latest checkpoint at or before frame.
+
+  brain must have the same shape as the checkpointed one. Loads the nearest
+  base snapshot and replays the deltas after it. Returns the restored frame.
+
+  Use Checkpointer.restore instead for a brain still being checkpointed into
+  directory, so later checkpoints don't mix with the old timeline.
+  """
+  checkpoints = listCheckpoints(directory)
+  bases = [f for (f, kind) in checkpoints if kind == 'base' and f <= frame]
+  if not bases:
+    raise ValueError('No base checkpoint at or before frame %d.' % frame)
+  base = max(bases)
+
+  restored = base
+  applyNeurons(brain, readCheckpoint(directory, 'base', base))
+  for (f, kind) in checkpoints:
+    if kind == 'delta' and base < f <= frame:
+      applyNeurons(brain, readCheckpoint(directory, 'delta', f))
+      restored = f
+
+  brain.frame = restored
+  for layer in brain.layers:
+    layer.frame_cache.clear()
+    if layer.prediction_cache is not None:
+      layer.prediction_cache.clear()
+  if brain.journal is not None:
+    brain.journal.clear()
+  return restored
+
+
+def listCheckpoints(directory):
+  """Return sorted (frame, kind) of the checkpoints in directory."""
+  checkpoints = []
+  for name in os.listdir(directory):
+    match = CHECKPOINT_FILE.match(name)
+    if match:
+      checkpoints.append((int(match.group(2)), match.group(1)))
+  return sorted(checkpoints)
+
+
+def checkpointPath(directory, kind, frame):
+  return os.path.join(directory, '%s-%010d.pkl' % (kind, frame))
+
+
+def readCheckpoint(directory, kind, frame):
+  with open(checkpointPath(directory, kind, frame), 'rb') as in_file:
+    return cPickle.load(in_file)
+
+
+def applyNeurons(brain, neurons):
+  for ((z, y, x), (state, connections)) in neurons.iteritems():
+    neuron = brain.layers[z].neurons[y, x]
+    neuron.is_on, neuron.last_on, neuron.potential = state
+    if connections is not None:
+      setNeuronConnections(neuron, connections)
+
+
+def layerStates(layer):
+  """Return height x width x 3 array of is_on, last_on and potential."""
+  return numpy.array([[neuronState(neuron) for neuron in row]
+                      for row in layer.neurons], dtype=float)
+
+
+def neuronState(neuron):
+  return neuron.is_on, neuron.last_on, neuron.potential
+
+
+def neuronConnections(neuron):
+  """
+  Return (strengths, strong indices by delay) for each connection group.
+
+  Strong connections are stored as indices into the group in set iteration
+  order.
+  """
+  groups = []
+  for (name, strong_name) in GROUPS:
+    connections = getattr(neuron, name)
+    index = dict((connection, i) for (i, connection) in enumerate(connections))
+    groups.append((
+      [connection.strength for connection in connections],
+      [[index[connection] for connection in strong]
+       for strong in getattr(neuron, strong_name)]))
+  return groups
+
+
+def setNeuronConnections(neuron, groups):
+  for ((name, strong_name), (strengths, strong_by_delay)) in zip(GROUPS,
+                                                                 groups):
+    connections = getattr(neuron, name)
+    for (connection, strength) in zip(connections, strengths):
+      connection.strength = strength
+    setattr(neuron, strong_name,
+            [set(connections[i] for i in strong) for strong in strong_by_delay])
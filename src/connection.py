@@ -32,6 +32,9 @@ class Connection(object):
   # http://en.wikipedia.org/wiki/Pyramidal_cell
   STDP_DECREMENT = 1
 
+  # Skip the per instance __dict__, as there are hundreds of these per neuron.
+  __slots__ = ('neighbor', 'strength')
+
   def __init__(self, to=None):
     self.neighbor = to
     self.strength = 0
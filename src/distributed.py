@@ -0,0 +1,317 @@
+import multiprocessing
+import random
+import sys
+from multiprocessing.connection import Client, Listener
+
+import numpy
+
+from brain import Brain
+from connection import Connection
+from layer import Layer
+from neuron import Neuron
+
+
+class ShardConnection(Connection):
+  """
+  A Connection hashed by its neighbor's position rather than by identity, so
+  strong connection sets iterate in the same order in every process.
+  Potentials depend on that order, since Neuron.potentialFromConnections
+  stops early.
+  """
+
+  __slots__ = ()
+
+  def __hash__(self):
+    neighbor = self.neighbor
+    return hash((neighbor.layer.layer_num, neighbor.y, neighbor.x))
+
+
+class ShardLayer(Layer):
+  """
+  The rows of a layer owned by one shard, plus ghost rows mirroring the
+  boundary rows of the shards above and below.
+
+  Neurons keep their brain-wide coordinates so connections are built exactly
+  as in a single process Brain. Rows outside the shard and its halo are None.
+  Ghost neurons never predict, observe or learn. Their state is copied from
+  the owning shard after each layer observes, by ShardBrain.afterObserve.
+  """
+
+  # Ghost potentials arrive from other shards, so predictions aren't a
+  # function of local history alone.
+  PREDICTION_CACHE_SIZE = 0
+
+  def initNeurons(self):
+    self.lo, self.hi = self.brain.rows
+    halo = self.brain.halo
+    self.neurons = numpy.empty((self.height, self.width), dtype=object)
+    self.ghosts = []
+    for y in xrange(max(0, self.lo - halo), min(self.height, self.hi + halo)):
+      for x in xrange(self.width):
+        neuron = self.neurons[y, x] = self.brain.createNeuron(layer=self, x=x,
+                                                              y=y)
+        if not self.lo <= y < self.hi:
+          self.ghosts.append(neuron)
+    self.owned = self.neurons[self.lo:self.hi]
+
+  def observe(self, signal):
+    """Observe the rows of signal belonging to this shard."""
+    if self.is_bottom:
+      self.setNeuronsToSensoryInput(signal)
+    else:
+      self.observe_vector(self.owned)
+    self.frame_cache.pop('state', None)
+
+  def setNeuronsToSensoryInput(self, signal):
+    for neuron in self.owned.flat:
+      neuron.set(signal[neuron.y - self.lo, neuron.x] == 1)
+
+  def learn(self):
+    self.brain.drawReinforcement(self)
+    self.learn_vector(self.owned)
+    # Every neuron resets its potential after learning, ghosts included.
+    for neuron in self.ghosts:
+      neuron.resetPotential()
+
+  def memoizeForFrame(self, name, vector):
+    return Layer.memoizeForFrame(self, name, lambda _: vector(self.owned))
+
+  def boundary(self, lo, hi):
+    """Return (is_on, last_on, potential) arrays for owned rows lo to hi."""
+    rows = self.neurons[lo:hi]
+    return (numpy.array([[n.is_on for n in row] for row in rows]),
+            numpy.array([[n.last_on for n in row] for row in rows]),
+            numpy.array([[n.potential for n in row] for row in rows]))
+
+  def setGhosts(self, lo, boundary):
+    """Copy a neighboring shard's boundary into ghost rows starting at lo."""
+    is_on, last_on, potential = boundary
+    for (j, row) in enumerate(self.neurons[lo:lo + len(is_on)]):
+      for (i, neuron) in enumerate(row):
+        neuron.is_on = bool(is_on[j, i])
+        neuron.last_on = int(last_on[j, i])
+        neuron.potential = potential[j, i]
+
+
+class ShardBrain(Brain):
+  """
+  A Brain holding rows [lo, hi) of every layer. See ShardLayer.
+
+  Perceives like any Brain, exchanging halos with the shards above and below
+  once each layer observes. A ShardBrain holding every row and connected to
+  nothing is a single process brain whose results a DistributedBrain
+  matches.
+  """
+
+  def __init__(self, num_layers, neurons_in_leaf_layer, rows,
+               coordinator=None, up=None, down=None):
+    """
+    Arguments:
+    num_layers, neurons_in_leaf_layer -- As for Brain.
+    rows -- (lo, hi) rows of every layer held by this shard.
+    coordinator -- Connection to the DistributedBrain handing out
+      reinforcement learning draws, or None to draw from Brain.random.
+    up, down -- Connections to the shards holding the rows above and below.
+    """
+    self.rows = rows
+    self.halo = haloRows()
+    self.coordinator = coordinator
+    self.up = up
+    self.down = down
+    Brain.__init__(self, num_layers, neurons_in_leaf_layer)
+
+  def createLayer(self, **kwargs):
+    return ShardLayer(**kwargs)
+
+  def createConnection(self, **kwargs):
+    return ShardConnection(**kwargs)
+
+  def initConnections(self):
+    for layer in self.layers:
+      for neuron in layer.owned.flat:
+        neuron.initConnections()
+
+  def afterObserve(self, layer):
+    # Learning and the layers above read neighbors' new state.
+    self.exchangeHalo(layer)
+
+  def drawReinforcement(self, layer):
+    """
+    Get this shard's share of the coordinator's random stream.
+
+    Neuron.learn only draws for neurons that are on and were predicted. The
+    coordinator hands out draws in shard order, which is the row major order a
+    single process would draw them in.
+    """
+    if self.coordinator is None:
+      return
+    wanted = sum(1 for neuron in layer.owned.flat
+                 if neuron.is_on and neuron.predicted)
+    self.coordinator.send(wanted)
+    self.random = iter(self.coordinator.recv()).next
+
+  def exchangeHalo(self, layer):
+    """
+    Swap boundary rows with the shards above and below.
+
+    The lower shard of each pair sends first, so large halos can't deadlock
+    on full socket buffers.
+    """
+    halo = self.halo
+    if self.up:
+      layer.setGhosts(layer.lo - halo, self.up.recv())
+      self.up.send(layer.boundary(layer.lo, layer.lo + halo))
+    if self.down:
+      self.down.send(layer.boundary(layer.hi - halo, layer.hi))
+      layer.setGhosts(layer.hi, self.down.recv())
+
+
+def haloRows():
+  """Rows of neighboring shards a shard's connections can reach."""
+  return max(Neuron.SIBLING_LOCALITY_DISTANCE,
+             Neuron.CHILD_LOCALITY_DISTANCE,
+             Neuron.PARENT_LOCALITY_DISTANCE)
+
+
+class ShardWorker(object):
+  """
+  Serves one shard of a DistributedBrain.
+
+  The coordinator connects first and sends the shard's configuration. Then
+  each shard connects to the one above it, so every shard holds a connection
+  to each row-adjacent shard for the halo exchange.
+  """
+  def __init__(self, listener, authkey):
+    self.listener = listener
+    self.authkey = authkey
+
+  def serve(self):
+    coordinator = self.listener.accept()
+    (num_layers, neurons_in_leaf_layer, rows, index,
+     addresses) = coordinator.recv()
+    up = down = None
+    if index > 0:
+      up = Client(addresses[index - 1], authkey=self.authkey)
+    if index < len(addresses) - 1:
+      down = self.listener.accept()
+    self.brain = ShardBrain(num_layers, neurons_in_leaf_layer, rows,
+                            coordinator=coordinator, up=up, down=down)
+    coordinator.send('ready')
+
+    while True:
+      message = coordinator.recv()
+      if message[0] == 'close':
+        break
+      _, signal, learn = message
+      self.brain.perceive(signal, learn)
+      coordinator.send([(snapshot.state, snapshot.predicted)
+                        for snapshot in self.brain.snapshot()])
+
+    for connection in (up, down, coordinator):
+      if connection:
+        connection.close()
+    self.listener.close()
+
+
+def serveShard(listener, authkey):
+  ShardWorker(listener, authkey).serve()
+
+
+def startLocalShards(num_shards, authkey):
+  """Start shard processes on localhost. Returns (addresses, processes)."""
+  addresses = []
+  processes = []
+  for _ in xrange(num_shards):
+    listener = Listener(('localhost', 0), authkey=authkey)
+    process = multiprocessing.Process(target=serveShard,
+                                      args=(listener, authkey))
+    process.daemon = True
+    process.start()
+    listener.close() # The child has its own copy.
+    addresses.append(listener.address)
+    processes.append(process)
+  return addresses, processes
+
+
+class DistributedBrain(object):
+  """
+  Drives a brain whose layers are split by rows across shard processes.
+
+  Each frame the coordinator sends every shard its rows of the signal, hands
+  out reinforcement learning draws and collects the shards' states. Shards
+  swap boundary rows with each other directly over TCP. Results match a
+  single process ShardBrain holding every row exactly as long as
+  IMPORTANCE_OF_NEIGHBOR_POTENTIAL is zero. Otherwise ghost potentials during
+  predict lag by the part of the pass that ran on the neighboring shard. A
+  plain Brain iterates strong connections in identity hash order, so its
+  potentials may add up in a different order.
+
+  Layers must all be the same size, i.e. LAYER_CONTRACTION_RATIO of 1, so
+  rows line up across layers.
+  """
+  def __init__(self, num_layers, neurons_in_leaf_layer, addresses, authkey,
+               random_source=None):
+    """
+    Arguments:
+    num_layers, neurons_in_leaf_layer -- As for Brain.
+    addresses -- (host, port) of each shard's worker, top rows first.
+    authkey -- Shared secret of the shard listeners.
+    random_source -- Function giving reinforcement learning draws, defaults
+      to random.random as in Brain.
+    """
+    if Brain.LAYER_CONTRACTION_RATIO != 1:
+      raise ValueError('Shards require layers of equal size.')
+    self.num_layers = num_layers
+    self.random = random_source or random.random
+    self.frame = 0
+
+    height = int(neurons_in_leaf_layer ** 0.5)
+    bounds = numpy.linspace(0, height, len(addresses) + 1).astype(int)
+    self.rows = zip(bounds[:-1], bounds[1:])
+    if min(hi - lo for (lo, hi) in self.rows) < haloRows():
+      raise ValueError('Each shard needs at least %d rows.' % haloRows())
+
+    self.shards = [Client(address, authkey=authkey) for address in addresses]
+    for (index, shard) in enumerate(self.shards):
+      shard.send((num_layers, neurons_in_leaf_layer, self.rows[index], index,
+                  addresses))
+    for shard in self.shards:
+      shard.recv() # ready
+
+    self.states = self.predictions = None
+
+  def perceive(self, signal, learn):
+    self.frame += 1
+    for (shard, (lo, hi)) in zip(self.shards, self.rows):
+      shard.send(('perceive', signal[lo:hi], learn))
+
+    if learn:
+      for _ in xrange(self.num_layers):
+        wanted = [shard.recv() for shard in self.shards]
+        for (shard, count) in zip(self.shards, wanted):
+          shard.send([self.random() for _ in xrange(count)])
+
+    results = [shard.recv() for shard in self.shards]
+    self.states = [numpy.vstack([result[i][0] for result in results])
+                   for i in xrange(self.num_layers)]
+    self.predictions = [numpy.vstack([result[i][1] for result in results])
+                        for i in xrange(self.num_layers)]
+
+  def state(self, layer_num=0):
+    """State of a layer after the last perceive."""
+    return self.states[layer_num]
+
+  def predict(self, layer_num=0):
+    """Prediction a layer made during the last perceive."""
+    return self.predictions[layer_num]
+
+  def close(self):
+    for shard in self.shards:
+      shard.send(('close', ))
+      shard.close()
+
+
+if __name__ == '__main__':
+  # Serve a shard on another host: python distributed.py host port authkey
+  host, port, authkey = sys.argv[1:4]
+  serveShard(Listener((host, int(port)), authkey=authkey), authkey)
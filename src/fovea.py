@@ -0,0 +1,69 @@
+import math
+
+import numpy
+
+
+class Fovea(object):
+  """
+  Cortical magnification for the leaf layer.
+  http://en.wikipedia.org/wiki/Cortical_magnification
+
+  Maps a large input onto a small square of leaf neurons. Within
+  fovea_radius of the attention point input is sampled one to one. Beyond
+  it, sampling radius grows exponentially with distance from the center of
+  the leaf layer, as in a log-polar retina, so the periphery reaches the far
+  corners of the input with few neurons. Neighboring neurons still see
+  neighboring input, which keeps local connectivity meaningful.
+
+  The sample positions are worked out once per attention point as an index
+  map, so each frame is sampled with a single gather.
+  """
+
+  def __init__(self, side, fovea_radius, input_width, input_height):
+    """
+    Args:
+      side: Width and height of the leaf layer.
+      fovea_radius: Radius, in neurons, of the one to one sampled center.
+      input_width: Width of the signal to be sampled.
+      input_height: Height of the signal to be sampled.
+    """
+    self.side = side
+    self.neurons = side * side
+    self.input_width = input_width
+    self.input_height = input_height
+
+    # The attention point is sampled by the neuron at (center, center).
+    center = side // 2
+    v, u = numpy.mgrid[0:side, 0:side] - center
+    out_radius = numpy.hypot(u, v)
+    angle = numpy.arctan2(v, u)
+
+    # Grow so the corners of the leaf layer sample the corners of the input.
+    max_out_radius = center * math.sqrt(2)
+    max_in_radius = math.hypot(input_width, input_height) / 2
+    if not 0 < fovea_radius < max_out_radius:
+      raise ValueError('fovea_radius must be between 0 and %f.' %
+                       max_out_radius)
+    growth = max(0.0, math.log(max_in_radius / fovea_radius) /
+                      (max_out_radius - fovea_radius))
+    in_radius = numpy.where(
+      out_radius <= fovea_radius,
+      out_radius,
+      fovea_radius * numpy.exp(growth * (out_radius - fovea_radius)))
+
+    # Input offsets from the attention point for each neuron.
+    self.offset_y = numpy.rint(in_radius * numpy.sin(angle)).astype(int)
+    self.offset_x = numpy.rint(in_radius * numpy.cos(angle)).astype(int)
+
+    self.attend(input_height // 2, input_width // 2)
+
+  def attend(self, y, x):
+    """Move the center of the fovea to row y, column x of the input."""
+    self.attention = (y, x)
+    rows = numpy.clip(self.offset_y + y, 0, self.input_height - 1)
+    columns = numpy.clip(self.offset_x + x, 0, self.input_width - 1)
+    self.index = rows * self.input_width + columns
+
+  def sample(self, signal):
+    """Return the side x side leaf signal for a 2D input signal."""
+    return numpy.take(signal, self.index)
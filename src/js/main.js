@@ -1,6 +1,6 @@
 // Generated by CoffeeScript 1.3.3
 (function() {
-  var testSelect, viewTest;
+  var liveSource, stopLive, testSelect, viewLive, viewTest;
 
   $(window).load(function() {
     return viewTest("bounce_then_line");
@@ -24,12 +24,35 @@
     return viewTest(testSelect.val());
   });
 
+  $("#live").click(function() {
+    var match, tapUrl;
+    match = /[?&]tap=([^&]+)/.exec(window.location.search);
+    if (match) {
+      tapUrl = decodeURIComponent(match[1]);
+    } else if (window.location.protocol === "file:") {
+      tapUrl = "http://localhost:8765";
+    } else {
+      tapUrl = "";
+    }
+    return viewLive(tapUrl);
+  });
+
   testSelect = $("#test_select");
 
   testSelect.append(Mustache.to_html($("#layer_template").html(), tests));
 
+  liveSource = null;
+
+  stopLive = function() {
+    if (liveSource) {
+      liveSource.close();
+    }
+    return liveSource = null;
+  };
+
   window.viewtest = viewTest = function(name) {
     var NUM_FRAMES, PIXEL_SIDE_LENGTH, SIDE_LENGTH, UNIT_SIZE, actual, actualCanvas, clearCanvas, draw, drawBigPixel, frameNum, getCanvas, getNextFrameIndex, predicted, predictedCanvas, timer;
+    stopLive();
     timer = null;
     draw = function(args) {
       var callback, frame, index, row, x, xx, y, yy;
@@ -131,4 +154,130 @@
     return true;
   };
 
+  window.viewLive = viewLive = function(tapUrl) {
+    var CHUNK_SIZE, PIXEL_SIDE_LENGTH, actualCanvas, following, frameNum, frames, getCanvas, index, latest, predictedCanvas;
+    stopLive();
+    PIXEL_SIDE_LENGTH = 256;
+    CHUNK_SIZE = 50;
+    following = true;
+    latest = -1;
+    index = -1;
+    frames = {};
+    getCanvas = function(id) {
+      var canvas, context;
+      canvas = document.getElementById(id);
+      canvas.width = PIXEL_SIDE_LENGTH;
+      canvas.height = PIXEL_SIDE_LENGTH;
+      context = canvas.getContext("2d");
+      context.fillStyle = "#000";
+      return context;
+    };
+    actualCanvas = getCanvas("actual");
+    predictedCanvas = getCanvas("predicted");
+    frameNum = $("#frame_num");
+    $.getJSON(tapUrl + "/layers", function(info) {
+      var FRAME_BYTES, HEIGHT, UNIT_SIZE, WIDTH, decode, drawPacked, fetchFrames, loadChunk, show;
+      WIDTH = info.layers[0].width;
+      HEIGHT = info.layers[0].height;
+      UNIT_SIZE = Math.max(1, Math.floor(PIXEL_SIDE_LENGTH / Math.max(WIDTH, HEIGHT)));
+      FRAME_BYTES = Math.ceil(WIDTH * HEIGHT / 8);
+      drawPacked = function(canvas, bytes) {
+        var bit, x, y;
+        canvas.clearRect(0, 0, PIXEL_SIDE_LENGTH, PIXEL_SIDE_LENGTH);
+        bit = 0;
+        while (bit < WIDTH * HEIGHT) {
+          if ((bytes[bit >> 3] >> (7 - (bit & 7))) & 1) {
+            x = bit % WIDTH;
+            y = Math.floor(bit / WIDTH);
+            canvas.fillRect(x * UNIT_SIZE, y * UNIT_SIZE, UNIT_SIZE, UNIT_SIZE);
+          }
+          bit++;
+        }
+      };
+      show = function(i) {
+        if (i < 0 || i > latest) {
+          return false;
+        }
+        index = i;
+        if (frames[i]) {
+          drawPacked(actualCanvas, frames[i][0]);
+          drawPacked(predictedCanvas, frames[i][1]);
+          frameNum.html(i);
+        } else {
+          loadChunk(i, function() {
+            if (frames[i] && index === i) {
+              return show(i);
+            }
+          });
+        }
+        return true;
+      };
+      fetchFrames = function(kind, start, callback) {
+        var xhr;
+        xhr = new XMLHttpRequest();
+        xhr.open("GET", tapUrl + "/frames/0/" + kind + "?start=" + start + "&end=" + (start + CHUNK_SIZE));
+        xhr.responseType = "arraybuffer";
+        xhr.onload = function() {
+          return callback(parseInt(xhr.getResponseHeader("X-Frame-Start"), 10), new Uint8Array(xhr.response));
+        };
+        return xhr.send();
+      };
+      loadChunk = function(i, callback) {
+        var start;
+        start = i - i % CHUNK_SIZE;
+        return fetchFrames("actual", start, function(first, actual) {
+          return fetchFrames("predicted", start, function(first, predicted) {
+            var j, offset;
+            j = 0;
+            while ((j + 1) * FRAME_BYTES <= actual.length) {
+              offset = j * FRAME_BYTES;
+              frames[first + j] = [actual.subarray(offset, offset + FRAME_BYTES), predicted.subarray(offset, offset + FRAME_BYTES)];
+              j++;
+            }
+            return callback();
+          });
+        });
+      };
+      decode = function(base64) {
+        var binary, bytes, i;
+        binary = atob(base64);
+        bytes = new Uint8Array(binary.length);
+        i = 0;
+        while (i < binary.length) {
+          bytes[i] = binary.charCodeAt(i);
+          i++;
+        }
+        return bytes;
+      };
+      liveSource = new EventSource(tapUrl + "/stream");
+      liveSource.addEventListener("frame", function(event) {
+        var leaf, message;
+        message = JSON.parse(event.data);
+        latest = message.frame;
+        leaf = message.layers[0];
+        frames[latest] = [decode(leaf[0]), decode(leaf[1])];
+        if (following) {
+          return show(latest);
+        }
+      });
+      $(".controls button").unbind("click");
+      $("#play").click(function() {
+        following = true;
+        return show(latest);
+      });
+      $("#stop").click(function() {
+        return following = false;
+      });
+      $("#step").click(function() {
+        following = false;
+        return show(index + 1);
+      });
+      return $("#back").click(function() {
+        following = false;
+        return show(index - 1);
+      });
+    });
+    return true;
+  };
+
 }).call(this);
@@ -1,6 +1,15 @@
+import collections
+
 import numpy as np
+from memo import PredictionCache, historyKey, last_on_vector, potential_vector
 from neuron import Neuron
 
+# A completed frame of a layer. Arrays are read-only and never change once
+# published. last_on and potential are None unless the brain has subscribers,
+# see Brain.subscribe.
+LayerSnapshot = collections.namedtuple(
+  'LayerSnapshot', ('frame', 'state', 'predicted', 'last_on', 'potential'))
+
 class Layer(object):
   """
   This represents a layer of the neo-cortex,
@@ -8,6 +17,11 @@ class Layer(object):
   Each layer halves as we move up the hierarchy,
   forming a sort of neuron pyramid.
   """
+
+  # Activity histories whose predictions are remembered, see
+  # memo.PredictionCache. Zero turns the cache off.
+  PREDICTION_CACHE_SIZE = 256
+
   def __init__(self,
                num_neurons,
                layer_num=-1,
@@ -33,6 +47,18 @@ class Layer(object):
     self.brain     = brain
     self.is_top    = is_top
     self.is_bottom = layer_num == 0
+
+    # Results of predict/state by name, as (frame, array) pairs.
+    self.frame_cache = {}
+
+    if self.PREDICTION_CACHE_SIZE:
+      self.prediction_cache = PredictionCache(self.PREDICTION_CACHE_SIZE)
+    else:
+      self.prediction_cache = None
+
+    # LayerSnapshot of the last completed frame, None until the first.
+    self.published = None
+
     self.initNeurons()
 
 
@@ -41,7 +67,10 @@ class Layer(object):
     for y in xrange(self.height):
       row = []
       for x in xrange(self.width):
-        row.append(Neuron(layer=self, x=x, y=y))
+        if self.brain:
+          row.append(self.brain.createNeuron(layer=self, x=x, y=y))
+        else:
+          row.append(Neuron(layer=self, x=x, y=y))
       neurons.append(row)
     self.neurons = np.array(neurons) # Two dimensional array of neurons.
 
@@ -58,6 +87,9 @@ class Layer(object):
     else:
       self.observe_vector(self.neurons)
 
+    # Neurons changed state within this frame.
+    self.frame_cache.pop('state', None)
+
   def setNeuronsToSensoryInput(self, signal):
     """
     This is only for layer zero and layer zero is basically a mirror of
@@ -81,20 +113,91 @@ class Layer(object):
   learn_vector = np.vectorize(lambda neuron: neuron.learn())
   def learn(self):
     """Adjust the connections to neurons in the same layer."""
-    self.learn_vector(self.neurons)
+    learned = self.learn_vector(self.neurons)
+    if self.prediction_cache is not None and learned.any():
+      # Strong connections changed, so remembered predictions are stale.
+      self.prediction_cache.clear()
 
   predict_vector = np.vectorize(lambda neuron: 1 if neuron.predict() else 0)
   def predict(self):
-    """Returns predicted state for next time cycle."""
-    return self.predict_vector(self.neurons)
+    """Returns predicted state for next time cycle.
+
+    Neuron.predict accumulates potential, so neurons only predict once per
+    frame. Later calls within the frame get the same read-only array.
+    Not thread safe: called from another thread before this layer's turn in
+    perceive, it predicts concurrently with perceive. Use snapshot() instead.
+    """
+    return self.memoizeForFrame('predict', self.predictFromHistory)
+
+  def predictFromHistory(self, neurons):
+    """
+    predict_vector, looked up in the prediction cache by the recent activity
+    of this layer and its parent. Neurons predict from nothing else.
 
-  expected_vector = np.vectorize(lambda neuron: 1 if neuron.expected() else 0)
-  def expected(self):
-    """Returns 1 for each neuron that expected previous input, zero if not."""
-    return self.expected_vector(self.neurons)
+    A hit skips Neuron.predict's walk over strong connections, but the key
+    and restoring potentials still take a pass over the neurons. Frames that
+    learn bypass the cache, as learning nearly always clears it.
+    """
+    cache = self.prediction_cache
+    if cache is None or (self.brain and self.brain.learning):
+      return self.predict_vector(neurons)
+
+    key = historyKey([self] if self.parent is None else [self, self.parent])
+    cached = cache.get(key)
+    if cached is not None:
+      prediction, potentials = cached
+      for (neuron, predicted, potential) in zip(neurons.flat, prediction.flat,
+                                                potentials):
+        neuron.predicted = bool(predicted)
+        neuron.potential = potential
+      return prediction
+
+    prediction = self.predict_vector(neurons)
+    prediction.flags.writeable = False
+    cache.put(key, (prediction, [neuron.potential for neuron in neurons.flat]))
+    return prediction
 
 
   state_vector = np.vectorize(lambda neuron: 1 if neuron.is_on else 0)
   def state(self):
-    """Return state of neurons."""
-    return self.state_vector(self.neurons)
\ No newline at end of file
+    """Return state of neurons. From other threads use snapshot()."""
+    return self.memoizeForFrame('state', self.state_vector)
+
+  def memoizeForFrame(self, name, vector):
+    """Apply vector to neurons once per brain frame.
+
+    Returns a read-only array shared by all callers within the frame.
+    """
+    frame = self.brain.frame if self.brain else None
+    cached = self.frame_cache.get(name)
+    if cached and frame is not None and cached[0] == frame:
+      return cached[1]
+    result = vector(self.neurons)
+    result.flags.writeable = False
+    self.frame_cache[name] = (frame, result)
+    return result
+
+  def publish(self):
+    """
+    Publish this frame's state for readers on other threads, see snapshot().
+
+    Perceive changes neurons in place, so the snapshot is built from arrays
+    owned by this frame alone and made visible with one attribute assignment,
+    which is atomic.
+    """
+    last_on = potential = None
+    if self.brain and self.brain.subscribers:
+      last_on = self.memoizeForFrame('last_on', last_on_vector)
+      potential = self.memoizeForFrame('potential', potential_vector)
+    self.published = LayerSnapshot(
+      self.brain.frame if self.brain else None, self.state(), self.predict(),
+      last_on, potential)
+    return self.published
+
+  def snapshot(self):
+    """
+    Return the LayerSnapshot of the last completed frame without locking.
+
+    Safe to call from any thread while the brain perceives.
+    """
+    return self.published
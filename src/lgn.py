@@ -0,0 +1,215 @@
+import os
+
+import numpy
+from PIL import Image, ImageSequence
+
+
+class LGN(object):
+  """
+  Front end in the spirit of the lateral geniculate nucleus. See the note in
+  Neuron.observe on the optic nerve's output channels.
+
+  Each frame is downsampled and split into binary channel maps, each of which
+  carries only a small amount of information about the scene. The channels
+  are tiled side by side into one square signal for the leaf layer, so a
+  Brain fed by an LGN needs lgn.neurons leaf neurons.
+
+  Everything is vectorized NumPy, so preprocessing costs a few milliseconds
+  per frame regardless of how many neurons come after it.
+  """
+
+  # Order in which channels are tiled into the leaf signal, left to right,
+  # top to bottom.
+  CHANNELS = ('intensity', 'edges', 'uniform', 'motion')
+
+  # Pixels darker than this are on in the intensity channel, as with the
+  # black on white test images in util.imagesToJSON. Intensities are 0 to 1.
+  INTENSITY_THRESHOLD = 0.5
+
+  # Change in intensity between neighboring pixels that counts as an edge.
+  EDGE_THRESHOLD = 0.1
+
+  # Local variance below which a pixel is within an area of uniform color.
+  UNIFORM_THRESHOLD = 0.001
+
+  # Half width of the square neighborhood uniformity is measured over.
+  UNIFORM_RADIUS = 1
+
+  # Change in intensity since the previous frame that counts as motion.
+  MOTION_THRESHOLD = 0.1
+
+  # Most of a channel that may be on. Only the strongest responses are kept
+  # beyond this, sparsifying the input before it reaches neurons.
+  MAX_ACTIVE_FRACTION = 0.1
+
+  # Part of a channel at or above the cutoff response beyond which the
+  # channel is saturated, e.g. a uniform background, and pixels tied at the
+  # cutoff are thinned out on a fixed lattice instead of kept whole.
+  SATURATED_FRACTION = 0.25
+
+  def __init__(self, width, height):
+    """
+    Args:
+      width: Width of each channel map after downsampling.
+      height: Height of each channel map after downsampling.
+    """
+    self.width = width
+    self.height = height
+    self.previous = None
+
+    # Channels are tiled into a square grid of channel maps.
+    self.grid_side = int(numpy.ceil(len(self.CHANNELS) ** 0.5))
+    side = self.grid_side * max(width, height)
+    self.neurons = side * side
+
+  def feed(self, brain, frames, learn):
+    """Perceive each of frames, e.g. from readFrames, with brain."""
+    for frame in frames:
+      brain.perceive(self.signal(frame), learn)
+
+  def signal(self, frame):
+    """Return 2D array of 1's and 0's of all channels for the leaf layer."""
+    channels = self.process(frame)
+    side = self.grid_side * max(self.width, self.height)
+    signal = numpy.zeros((side, side), dtype=numpy.int32)
+    for (i, channel) in enumerate(channels):
+      row, column = divmod(i, self.grid_side)
+      y = row * self.height
+      x = column * self.width
+      signal[y:y + self.height, x:x + self.width] = channel
+    return signal
+
+  def process(self, frame):
+    """
+    Return channels x height x width array of 1's and 0's for a frame.
+
+    Args:
+      frame: 2D array of intensities from 0 to 1, at least width x height.
+    """
+    frame = self.downsample(numpy.asarray(frame, dtype=float))
+
+    vertical = numpy.zeros(frame.shape)
+    vertical[1:] = numpy.abs(numpy.diff(frame, axis=0))
+    horizontal = numpy.zeros(frame.shape)
+    horizontal[:, 1:] = numpy.abs(numpy.diff(frame, axis=1))
+    contrast = numpy.maximum(vertical, horizontal)
+
+    mean = boxMean(frame, self.UNIFORM_RADIUS)
+    variance = boxMean(frame ** 2, self.UNIFORM_RADIUS) - mean ** 2
+
+    if self.previous is None:
+      change = numpy.zeros(frame.shape)
+    else:
+      change = numpy.abs(frame - self.previous)
+    self.previous = frame
+
+    # Responses are positive where a channel is on, larger is stronger.
+    responses = {
+      'intensity': self.INTENSITY_THRESHOLD - frame,
+      'edges': contrast - self.EDGE_THRESHOLD,
+      'uniform': self.UNIFORM_THRESHOLD - variance,
+      'motion': change - self.MOTION_THRESHOLD,
+    }
+    return numpy.array([self.sparsify(responses[name])
+                        for name in self.CHANNELS])
+
+  def downsample(self, frame):
+    """Average frame down to height x width."""
+    fy = frame.shape[0] // self.height
+    fx = frame.shape[1] // self.width
+    if not fy or not fx:
+      raise ValueError('Frame of shape %s is smaller than %d x %d.' %
+                       (frame.shape, self.width, self.height))
+    h = frame.shape[0] // fy * fy
+    w = frame.shape[1] // fx * fx
+    blocks = frame[:h, :w].reshape(h // fy, fy, w // fx, fx).mean(axis=(1, 3))
+    if blocks.shape != (self.height, self.width):
+      # Sizes aren't multiples of each other. Pick the nearest blocks.
+      rows = numpy.arange(self.height) * blocks.shape[0] // self.height
+      columns = numpy.arange(self.width) * blocks.shape[1] // self.width
+      blocks = blocks[numpy.ix_(rows, columns)]
+    return blocks
+
+  def sparsify(self, response):
+    """
+    On where response is positive, keeping only the strongest if too many.
+
+    The cap is on response value rather than rank, so pixels tied at the
+    cutoff are kept or thinned together and don't flicker from frame to
+    frame. Ties are common, e.g. every edge of a hard-edged line has the same
+    contrast, so a channel may go somewhat over MAX_ACTIVE_FRACTION, up to
+    SATURATED_FRACTION.
+    """
+    # Pixels are 8-bit, so this only drops float error from boxMean, which
+    # would otherwise break ties by position.
+    response = numpy.round(response, 9)
+    active = response > 0
+    limit = int(self.MAX_ACTIVE_FRACTION * response.size)
+    if active.sum() <= limit:
+      return active.astype(numpy.int32)
+    if not limit:
+      return numpy.zeros(response.shape, dtype=numpy.int32)
+
+    flat = response.ravel()
+    cutoff = flat[numpy.argpartition(flat, -limit)[-limit]]
+    active = response >= cutoff
+    if active.sum() > self.SATURATED_FRACTION * response.size:
+      above = response > cutoff
+      active = above | ((response == cutoff) &
+                        lattice(response.shape, limit - above.sum()))
+    return active.astype(numpy.int32)
+
+
+def boxMean(arr, radius):
+  """Mean over the (2 * radius + 1) square around each element."""
+  side = 2 * radius + 1
+  padded = numpy.pad(arr, radius, mode='edge')
+  sums = numpy.zeros((padded.shape[0] + 1, padded.shape[1] + 1))
+  sums[1:, 1:] = padded.cumsum(axis=0).cumsum(axis=1)
+  box = (sums[side:, side:] - sums[:-side, side:] -
+         sums[side:, :-side] + sums[:-side, :-side])
+  return box / (side * side)
+
+
+def lattice(shape, count):
+  """Mask of a fixed square lattice of at most count points over shape."""
+  stride = 1
+  while -(-shape[0] // stride) * -(-shape[1] // stride) > count:
+    stride += 1
+  mask = numpy.zeros(shape, dtype=bool)
+  mask[::stride, ::stride] = True
+  return mask
+
+
+IMAGE_EXTENSIONS = ('.bmp', '.gif', '.jpeg', '.jpg', '.png', '.tif', '.tiff')
+
+def readFrames(path):
+  """
+  Yield grayscale frames from 0 to 1 from a video, an image, including every
+  frame of an animated gif, or a folder of images in name order.
+
+  Decoding videos requires OpenCV (cv2).
+  """
+  if os.path.isdir(path):
+    names = sorted(name for name in os.listdir(path)
+                   if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS)
+    for name in names:
+      for frame in readFrames(os.path.join(path, name)):
+        yield frame
+  elif os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS:
+    for image in ImageSequence.Iterator(Image.open(path)):
+      yield numpy.asarray(image.convert('L'), dtype=float) / 255
+  else:
+    try:
+      import cv2
+    except ImportError:
+      raise ImportError('Reading video requires OpenCV (cv2): ' + path)
+    video = cv2.VideoCapture(path)
+    try:
+      while True:
+        ok, frame = video.read()
+        if not ok:
+          break
+        yield cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY).astype(float) / 255
+    finally:
+      video.release()
@@ -0,0 +1,69 @@
+import collections
+import hashlib
+
+import numpy
+
+
+class PredictionCache(object):
+  """
+  Remembers what a layer predicted for recent activity histories.
+
+  A neuron's prediction depends only on its strong connections and on the
+  last_on and potential of the neurons they reach, i.e. the last MAX_HISTORY
+  frames of activity in its own and its parent layer. While nothing learns,
+  the same history always gives the same prediction, so a repeating input
+  can skip walking strong connections in Neuron.predict. Entries are keyed
+  on a digest of that history and evicted least recently used first.
+  Learning changes strong connections, so Layer.learn clears the cache
+  whenever a neuron learned, and the cache is only used by frames that
+  don't learn.
+  """
+
+  def __init__(self, max_size):
+    self.max_size = max_size
+    self.entries = collections.OrderedDict()
+    self.hits = self.misses = self.evictions = 0
+
+  def get(self, key):
+    """Return the value stored for key, or None."""
+    value = self.entries.pop(key, None)
+    if value is None:
+      self.misses += 1
+      return None
+    self.hits += 1
+    self.entries[key] = value # Most recently used.
+    return value
+
+  def put(self, key, value):
+    self.entries.pop(key, None)
+    while len(self.entries) >= self.max_size:
+      self.entries.popitem(last=False)
+      self.evictions += 1
+    self.entries[key] = value
+
+  def clear(self):
+    self.entries.clear()
+
+  def hitRate(self):
+    lookups = self.hits + self.misses
+    return float(self.hits) / lookups if lookups else 0.0
+
+  def stats(self):
+    """Counters for sizing Layer.PREDICTION_CACHE_SIZE."""
+    return {'hits': self.hits, 'misses': self.misses,
+            'evictions': self.evictions, 'size': len(self.entries),
+            'hit_rate': self.hitRate()}
+
+
+last_on_vector = numpy.vectorize(lambda neuron: neuron.last_on,
+                                 otypes=[numpy.int64])
+potential_vector = numpy.vectorize(lambda neuron: neuron.potential,
+                                   otypes=[numpy.float64])
+
+def historyKey(layers):
+  """Digest of the last_on and potential of every neuron in layers."""
+  digest = hashlib.sha1()
+  for layer in layers:
+    digest.update(last_on_vector(layer.neurons).tostring())
+    digest.update(potential_vector(layer.neurons).tostring())
+  return digest.digest()
@@ -1,7 +1,4 @@
 import numpy
-import random
-
-from connection import Connection
 
 
 class Neuron(object):
@@ -124,6 +121,18 @@ class Neuron(object):
 
     self.potential = 0
 
+    self.initConnectionGroups()
+
+    # Current state of neuron.
+    self.is_on = False
+
+    # The minimum number of frames ago that this neuron was on.
+    # This is base 1 so a value of 1 means just on whereas
+    # value of zero means the neuron has not been on recently.
+    self.last_on = 0
+
+  def initConnectionGroups(self):
+    """Create empty connection containers, filled in by initConnections."""
     #TODO: Create ConnectionGroup container class, a constituent of the Column/Neuron class.
     self.parent_connections  = []
     self.child_connections   = []
@@ -135,15 +144,7 @@ class Neuron(object):
     self.strong_parent_connections  = [set() for _ in xrange(self.MAX_HISTORY)]
 
     # TODO?: Make siblings a 3D array (x, y, t) of connections to allow for more
-    # numpy speediness.
-
-    # Current state of neuron.
-    self.is_on = False
-
-    # The minimum number of frames ago that this neuron was on.
-    # This is base 1 so a value of 1 means just on whereas
-    # value of zero means the neuron has not been on recently.
-    self.last_on = 0
+    # numpy speediness. See paging.PagedNeuron.
 
   def initConnections(self):
     """Initialize the connections of this neuron to other neurons.
@@ -204,15 +205,20 @@ class Neuron(object):
 
   def relativePositionWithinLayer(self, layer):
     """ Return relative position of self within another layer."""
-    rel_x = float(self.x + 1) / layer.width
-    rel_y = float(self.y + 1) / layer.height
-    center_x = int(round(rel_x * layer.child.width)) - 1
-    center_y = int(round(rel_y * layer.child.height)) - 1
+    rel_x = float(self.x + 1) / self.layer.width
+    rel_y = float(self.y + 1) / self.layer.height
+    center_x = int(round(rel_x * layer.width)) - 1
+    center_y = int(round(rel_y * layer.height)) - 1
     return center_x, center_y
 
   def initConnectionsForLayer(self, layer, connections, center_x, center_y,
                               distance):
     """ Add connections to neurons in `layer` within specified `distance`."""
+    for neighbor in self.neighborsWithin(layer, center_x, center_y, distance):
+      connections.append(self.brain.createConnection(to=neighbor))
+
+  def neighborsWithin(self, layer, center_x, center_y, distance):
+    """Yield the neurons of `layer` within `distance`, other than self."""
     min_x, max_x, min_y, max_y = self._minMaxXY(
       center_x,
       center_y,
@@ -223,7 +229,7 @@ class Neuron(object):
       for x in xrange(min_x, max_x + 1):
         neighbor = layer.neurons[y, x]
         if neighbor != self:
-          connections.append(Connection(to=neighbor))
+          yield neighbor
 
   def _minMaxXY(self, x, y, width, height, distance):
     """Returns bounds for 2D area of potential connections."""
@@ -250,9 +256,9 @@ class Neuron(object):
     if not self.layer.is_bottom:
       # Layer zero gets set directly to input for now.
 
-      # TODO: Sparsify input by creating an LGN type of preprocessing
-      # that sends color, background, intensity, contrast, areas of uniform color
-      # etc...
+      # Input can be sparsified by an LGN type of preprocessing that sends
+      # color, background, intensity, contrast, areas of uniform color etc...
+      # See lgn.LGN.
       #
       # From How to Create a Mind:
       # In a study published in Nature, Frank S. Werblin, professor of molecular
@@ -280,10 +286,12 @@ class Neuron(object):
     """Adjust connection strengths with other neurons.
     Strengthen sibling connections from previous time cycle per STDP.
     http://en.wikipedia.org/wiki/Spike-timing-dependent_plasticity
+    Returns whether any connections were adjusted.
 
     TODO: Learn subset of connections online and adjust all connections offline
           over longer periods of time. (Like hippocampus / sleep patterns)
     """
+    learned = False
     if self.is_on and (
 
       # If reality not predicted by the past, learn.
@@ -291,14 +299,18 @@ class Neuron(object):
 
       # Take time to reinforce what we already know, but don't spend too much
       # energy on it.
-      random.random() < self.REINFORCEMENT_LEARNING_RATIO
+      self.brain.random() < self.REINFORCEMENT_LEARNING_RATIO
     ):
 
       self.learn_from_children()
       self.learn_from_parents()
       self.learn_from_siblings()
+      if self.brain.journal is not None:
+        self.brain.journal.add(self)
+      learned = True
 
     self.resetPotential()
+    return learned
 
   def learn_from_children(self):
     self.learn_from(self.child_connections, self.strong_child_connections)
@@ -307,7 +319,7 @@ class Neuron(object):
     self.learn_from(self.parent_connections, self.strong_parent_connections)
 
   def learn_from_siblings(self):
-    self.learn_from(self.child_connections, self.strong_sibling_connections)
+    self.learn_from(self.sibling_connections, self.strong_sibling_connections)
 
   def learn_from(self, connections, strong_connections):
     # Different connections have different propagation times.
@@ -355,8 +367,9 @@ class Neuron(object):
   def testConnections(self, connections, threshold):
     max_potential = threshold * self.THRESHOLD_SIZE
     for delay in self.HISTORY_RANGE:
-      self.potential += self.potentialFromConnections(connections[delay - 1],
-                                                 delay, max_potential)
+      self.potential = self.potentialFromConnections(connections[delay - 1],
+                                                delay, max_potential,
+                                                self.potential)
       if self.potential > max_potential:
         # set of connections is different than normal connections.
         break
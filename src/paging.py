@@ -0,0 +1,335 @@
+import collections
+import os
+
+import numpy
+
+from connection import Connection
+from neuron import Neuron
+
+
+# Connection groups of a PagedNeuron, in the order its slots are filled.
+SIBLING, CHILD, PARENT = 0, 1, 2
+
+# Group of unused slots. Neurons near the edge of a layer have fewer
+# connections than there are slots.
+EMPTY = -1
+
+# One connection of a PagedNeuron. The neighbor is at (y + dy, x + dx) of the
+# group's layer, and bit delay - 1 of strong is set when the connection is in
+# the strong connections for that delay, as in Neuron.strong_sibling_connections.
+SLOT = numpy.dtype([('strength', numpy.int64), ('group', numpy.int8),
+                    ('dy', numpy.int16), ('dx', numpy.int16),
+                    ('strong', numpy.uint8)])
+
+
+class Slot(object):
+  """Read only view of a paged connection, in place of a Connection."""
+
+  __slots__ = ('index', 'neighbor', 'strength')
+
+  def __init__(self, index, neighbor, strength):
+    self.index = index
+    self.neighbor = neighbor
+    self.strength = strength
+
+
+class StrongSlots(object):
+  """A group's strong connections for one delay, read from a neuron's slots."""
+
+  def __init__(self, neuron, slots, group, delay):
+    self.neuron = neuron
+    self.slots = slots
+    self.group = group
+    self.bit = 1 << (delay - 1)
+
+  def indices(self):
+    slots = self.slots
+    return numpy.flatnonzero((slots['group'] == self.group) &
+                             (slots['strong'] & self.bit != 0))
+
+  def __iter__(self):
+    for i in self.indices():
+      yield self.neuron.slot(self.slots, i)
+
+  def __len__(self):
+    return len(self.indices())
+
+
+class PagedNeuron(Neuron):
+  """
+  A Neuron whose connections live in its row of a RegionStore region rather
+  than in Connection objects and sets.
+
+  Connections are slots of a SLOT array: siblings, then children, then
+  parents, in the order Neuron.initConnections would create them. Strong
+  connections are bits of each slot. Learning adjusts a whole group's slots
+  at once with numpy, following Connection.adjust_strength. The connection
+  attributes of Neuron are read only views built from the slots on access.
+  """
+
+  def initConnectionGroups(self):
+    # Connections are paged in by RegionStore.slots.
+    pass
+
+  def initConnections(self):
+    groups = [(SIBLING, self.layer, self.x, self.y,
+               self.SIBLING_LOCALITY_DISTANCE)]
+    if self.layer.child:
+      center_x, center_y = self.relativePositionWithinLayer(self.layer.child)
+      groups.append((CHILD, self.layer.child, center_x, center_y,
+                     self.CHILD_LOCALITY_DISTANCE))
+    if self.layer.parent:
+      center_x, center_y = self.relativePositionWithinLayer(self.layer.parent)
+      groups.append((PARENT, self.layer.parent, center_x, center_y,
+                     self.PARENT_LOCALITY_DISTANCE))
+
+    slots = self.brain.store.slots(self, write=True)
+    i = 0
+    for (group, layer, center_x, center_y, distance) in groups:
+      for neighbor in self.neighborsWithin(layer, center_x, center_y,
+                                           distance):
+        slots[i] = (0, group, neighbor.y - self.y, neighbor.x - self.x, 0)
+        i += 1
+
+  def neighborLayer(self, group):
+    return (self.layer, self.layer.child, self.layer.parent)[group]
+
+  def slot(self, slots, i):
+    """Return a Slot view of slots[i]."""
+    layer = self.neighborLayer(slots['group'][i])
+    neighbor = layer.neurons[self.y + slots['dy'][i], self.x + slots['dx'][i]]
+    return Slot(i, neighbor, int(slots['strength'][i]))
+
+  def connections(self, group):
+    slots = self.brain.store.slots(self)
+    return [self.slot(slots, i)
+            for i in numpy.flatnonzero(slots['group'] == group)]
+
+  def strongConnections(self, group):
+    slots = self.brain.store.slots(self)
+    return [StrongSlots(self, slots, group, delay)
+            for delay in self.HISTORY_RANGE]
+
+  sibling_connections = property(lambda self: self.connections(SIBLING))
+  child_connections = property(lambda self: self.connections(CHILD))
+  parent_connections = property(lambda self: self.connections(PARENT))
+  strong_sibling_connections = property(
+    lambda self: self.strongConnections(SIBLING))
+  strong_child_connections = property(
+    lambda self: self.strongConnections(CHILD))
+  strong_parent_connections = property(
+    lambda self: self.strongConnections(PARENT))
+
+  def potentialFromConnections(self, connections, delay, max_potential,
+                               current_potential):
+    # Only build views of the connections that count.
+    slots = connections.slots
+    layer = self.neighborLayer(connections.group)
+    for i in connections.indices():
+      neighbor = layer.neurons[self.y + slots['dy'][i],
+                               self.x + slots['dx'][i]]
+      if neighbor.last_on == delay:
+        current_potential += self.potentialFromConnection(
+          Slot(i, neighbor, int(slots['strength'][i])))
+        if current_potential > max_potential:
+          return current_potential
+    return current_potential
+
+  def learn_from_children(self):
+    self.learnGroup(CHILD)
+
+  def learn_from_parents(self):
+    self.learnGroup(PARENT)
+
+  def learn_from_siblings(self):
+    self.learnGroup(SIBLING)
+
+  def learnGroup(self, group):
+    """Neuron.learn_from for all of a group's slots at once."""
+    slots = self.brain.store.slots(self, write=True)
+    indices = numpy.flatnonzero(slots['group'] == group)
+    if not len(indices):
+      return
+    layer = self.neighborLayer(group)
+    last_on = numpy.array([layer.neurons[self.y + dy, self.x + dx].last_on
+                           for (dy, dx) in zip(slots['dy'][indices],
+                                               slots['dx'][indices])])
+    strength = slots['strength'][indices]
+    strong = slots['strong'][indices]
+    for delay in self.HISTORY_RANGE:
+      # Connection.boost_strength where the neighbor fired delay frames ago,
+      # Connection.decrease_strength elsewhere, clamped without overflowing.
+      boost = last_on == delay
+      strength = numpy.where(
+        boost,
+        numpy.minimum(strength, Connection.MAX_CONNECTION_STRENGTH -
+                                Connection.STDP_INCREMENT) +
+          Connection.STDP_INCREMENT,
+        numpy.maximum(strength, Connection.MIN_CONNECTION_STRENGTH +
+                                Connection.STDP_DECREMENT) -
+          Connection.STDP_DECREMENT)
+      predictive = strength >= Connection.PREDICTIVE_CONNECTION_THRESHOLD
+      add = numpy.where(
+        boost, predictive,
+        predictive & (strength <= Connection.INHIBITORY_CONNECTION_THRESHOLD))
+      remove = numpy.where(
+        boost,
+        ~predictive & (strength > Connection.INHIBITORY_CONNECTION_THRESHOLD),
+        ~predictive)
+      bit = numpy.uint8(1 << (delay - 1))
+      strong = numpy.where(add, strong | bit,
+                           numpy.where(remove, strong & ~bit, strong))
+    slots['strength'][indices] = strength
+    slots['strong'][indices] = strong
+
+
+class Region(object):
+  """Slots of a square of neurons, height x width x slots per neuron."""
+  def __init__(self, data):
+    self.data = data
+    self.dirty = False
+
+
+class RegionStore(object):
+  """
+  Out-of-core storage of connections for brains larger than RAM.
+
+  Each layer is cut into region_side x region_side squares of neurons. The
+  connections of a region's neurons, as SLOT arrays, are kept in one memory
+  mapped file. Brains with a store are made of PagedNeurons, which hold no
+  connections of their own. At most max_regions regions are held in memory,
+  least recently used first out, and dirty regions are written back when
+  evicted or flushed.
+
+  Connectivity is local (see Neuron.initConnectionsForLayer), so activity
+  only touches regions near active neurons. Brain.perceive calls prefetch()
+  before each layer steps to load the regions around currently active
+  neurons before the input reaches them.
+  """
+
+  def __init__(self, directory, region_side=16, max_regions=64):
+    """
+    Args:
+      directory: Where to keep region files. Connections already there are
+        not reused, each store starts with new connections.
+      region_side: Width and height of a region in neurons.
+      max_regions: Regions to hold in memory at once.
+    """
+    self.directory = directory
+    self.region_side = region_side
+    self.max_regions = max_regions
+    if not os.path.isdir(directory):
+      os.makedirs(directory)
+
+    # Most connections any neuron can have: a sibling square without itself
+    # plus child and parent squares.
+    self.slot_count = sum((2 * distance + 1) ** 2 for distance in (
+      Neuron.SIBLING_LOCALITY_DISTANCE,
+      Neuron.CHILD_LOCALITY_DISTANCE,
+      Neuron.PARENT_LOCALITY_DISTANCE)) - 1
+    if Neuron.MAX_HISTORY > 8 * SLOT['strong'].itemsize:
+      raise ValueError('Too much history for SLOT strong bits.')
+
+    self.cache = collections.OrderedDict()
+    # Regions that have been written to disk.
+    self.written = set()
+    self.hits = self.misses = self.prefetches = 0
+    self.evictions = self.writebacks = 0
+
+  def createNeuron(self, **kwargs):
+    return PagedNeuron(**kwargs)
+
+  def slots(self, neuron, write=False):
+    """
+    Return neuron's SLOT array, a view into its region. Pass write=True when
+    changing it. Don't hold on to it across other calls to the store, which
+    may evict the region.
+    """
+    side = self.region_side
+    region = self.region((neuron.layer.layer_num, neuron.y // side,
+                          neuron.x // side))
+    if write:
+      region.dirty = True
+    return region.data[neuron.y % side, neuron.x % side]
+
+  def region(self, key):
+    """Return the in memory Region for (layer_num, region_y, region_x)."""
+    region = self.cache.pop(key, None)
+    if region is None:
+      self.misses += 1
+      region = self.load(key)
+    else:
+      self.hits += 1
+    self.cache[key] = region # Most recently used.
+    return region
+
+  def prefetch(self, layer):
+    """Load regions within reach of the active neurons of layer."""
+    side = self.region_side
+    reach = -(-max(Neuron.SIBLING_LOCALITY_DISTANCE,
+                   Neuron.CHILD_LOCALITY_DISTANCE,
+                   Neuron.PARENT_LOCALITY_DISTANCE) // side) # Ceiling.
+    rows = -(-layer.height // side)
+    columns = -(-layer.width // side)
+    wanted = set()
+    for (y, x) in zip(*layer.state().nonzero()):
+      for ry in xrange(max(0, y // side - reach), min(rows, y // side + reach + 1)):
+        for rx in xrange(max(0, x // side - reach),
+                         min(columns, x // side + reach + 1)):
+          wanted.add((layer.layer_num, ry, rx))
+    # Don't let the prefetch evict what it has just loaded.
+    for key in sorted(wanted)[:self.max_regions]:
+      if key not in self.cache:
+        self.prefetches += 1
+        self.cache[key] = self.load(key)
+
+  def load(self, key):
+    while len(self.cache) >= self.max_regions:
+      evicted_key, evicted = self.cache.popitem(last=False)
+      self.evictions += 1
+      if evicted.dirty:
+        self.writeBack(evicted_key, evicted)
+
+    if key not in self.written:
+      # Filled in by PagedNeuron.initConnections.
+      data = numpy.zeros(self.shape(), dtype=SLOT)
+      data['group'] = EMPTY
+      return Region(data)
+    mapped = numpy.memmap(self.path(key), dtype=SLOT, mode='r',
+                          shape=self.shape())
+    data = numpy.array(mapped)
+    del mapped
+    return Region(data)
+
+  def writeBack(self, key, region):
+    mode = 'r+' if key in self.written else 'w+'
+    self.written.add(key)
+    mapped = numpy.memmap(self.path(key), dtype=SLOT, mode=mode,
+                          shape=self.shape())
+    mapped[:] = region.data
+    mapped.flush()
+    del mapped
+    region.dirty = False
+    self.writebacks += 1
+
+  def flush(self):
+    """Write every dirty region in memory back to disk."""
+    for (key, region) in self.cache.items():
+      if region.dirty:
+        self.writeBack(key, region)
+
+  def shape(self):
+    return (self.region_side, self.region_side, self.slot_count)
+
+  def path(self, key):
+    return os.path.join(self.directory, 'region-%d-%d-%d.bin' % key)
+
+  def hitRate(self):
+    lookups = self.hits + self.misses
+    return float(self.hits) / lookups if lookups else 0.0
+
+  def stats(self):
+    """Counters for sizing max_regions."""
+    return {'hits': self.hits, 'misses': self.misses,
+            'prefetches': self.prefetches, 'evictions': self.evictions,
+            'writebacks': self.writebacks, 'hit_rate': self.hitRate()}
@@ -0,0 +1,224 @@
+import BaseHTTPServer
+import SimpleHTTPServer
+import SocketServer
+import base64
+import json
+import os
+import posixpath
+import threading
+import urllib
+import urlparse
+
+import numpy
+
+
+class StateTap(object):
+  """
+  Serves the state of a running Brain to show.html over HTTP.
+
+  Attach to a brain with brain.attach(tap), then tap.start(). Each frame is
+  stored as bit-packed state and prediction per layer, so recording costs
+  width * height / 8 bytes per layer per frame and never pauses perception
+  for more than a packbits.
+
+  Endpoints:
+    /layers -- JSON of layer sizes and the range of recorded frames.
+    /frames/<layer>/<actual|predicted>?start=N&end=M -- Binary frames N to M
+      (exclusive), concatenated, each numpy.packbits of the row major frame.
+      Frames are numbered by brain.frame, as are checkpoints and snapshots.
+    /stream -- Server sent events, one 'frame' event per perceive with the
+      latest frame of every layer base64 encoded.
+  Anything else is served as a static file from the src directory so the
+  viewer can be loaded from the tap itself.
+  """
+
+  # Frames to keep in memory. Older frames are dropped from the front.
+  MAX_HISTORY_FRAMES = 10000
+
+  KINDS = ('actual', 'predicted')
+
+  def __init__(self, brain, port=8765, host='localhost'):
+    self.brain = brain
+    self.address = (host, port)
+    self.layer_sizes = [(layer.width, layer.height) for layer in brain.layers]
+
+    # history[i] is a list of (actual, predicted) byte strings per layer for
+    # brain frame first_frame + i. Guarded by new_frame, as onFrame trims it.
+    self.history = []
+    self.first_frame = brain.frame + 1
+    # Frames recorded since start, for waitForFrame.
+    self.recorded = 0
+    self.new_frame = threading.Condition()
+    self.server = None
+
+  def start(self):
+    """Start serving on a daemon thread."""
+    class Handler(TapRequestHandler):
+      tap = self
+    self.server = ThreadingHTTPServer(self.address, Handler)
+    thread = threading.Thread(target=self.server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return self
+
+  def stop(self):
+    if self.server:
+      self.server.shutdown()
+      self.server.server_close()
+      self.server = None
+    with self.new_frame:
+      self.new_frame.notify_all()
+
+  def onFrame(self, brain):
+    frame = []
+    for snapshot in brain.snapshot():
+      frame.append((self.pack(snapshot.state), self.pack(snapshot.predicted)))
+
+    with self.new_frame:
+      if brain.frame != self.first_frame + len(self.history):
+        # Attached mid-run or the brain was restored to another frame.
+        self.history = []
+        self.first_frame = brain.frame
+      self.history.append(frame)
+      self.recorded += 1
+      overflow = len(self.history) - self.MAX_HISTORY_FRAMES
+      if overflow > 0:
+        del self.history[:overflow]
+        self.first_frame += overflow
+      self.new_frame.notify_all()
+
+  def pack(self, arr):
+    return numpy.packbits(numpy.asarray(arr, dtype=numpy.uint8)).tostring()
+
+  def frameRange(self):
+    """Return (first, end) frame numbers of the recorded history."""
+    with self.new_frame:
+      return self.first_frame, self.first_frame + len(self.history)
+
+  def frames(self, layer_num, kind, start, end):
+    """Return packed frames [start, end) of a layer, clipped to history."""
+    kind_index = self.KINDS.index(kind)
+    with self.new_frame:
+      first = self.first_frame
+      start = max(start, first)
+      end = min(end, first + len(self.history))
+      packed = [self.history[i - first][layer_num][kind_index]
+                for i in xrange(start, end)]
+    return start, ''.join(packed)
+
+  def waitForFrame(self, recorded, timeout=15):
+    """
+    Block until more than `recorded` frames have been recorded since start.
+    Returns the number recorded.
+    """
+    with self.new_frame:
+      if self.recorded <= recorded and self.server:
+        self.new_frame.wait(timeout)
+      return self.recorded
+
+  def latest(self):
+    """Return (frame number, per layer (actual, predicted)) of newest frame."""
+    with self.new_frame:
+      if not self.history:
+        return -1, None
+      return self.first_frame + len(self.history) - 1, self.history[-1]
+
+
+class ThreadingHTTPServer(SocketServer.ThreadingMixIn,
+                          BaseHTTPServer.HTTPServer):
+  daemon_threads = True
+  allow_reuse_address = True
+
+
+class TapRequestHandler(SimpleHTTPServer.SimpleHTTPRequestHandler):
+  # Set to the StateTap being served.
+  tap = None
+
+  # Static files are served relative to the directory containing show.html.
+  STATIC_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+  def do_GET(self):
+    url = urlparse.urlparse(self.path)
+    parts = [part for part in url.path.split('/') if part]
+    query = urlparse.parse_qs(url.query)
+    try:
+      if parts == ['layers']:
+        self.sendLayers()
+      elif len(parts) == 3 and parts[0] == 'frames':
+        self.sendFrames(int(parts[1]), parts[2], query)
+      elif parts == ['stream']:
+        self.sendStream()
+      else:
+        SimpleHTTPServer.SimpleHTTPRequestHandler.do_GET(self)
+    except (ValueError, IndexError), e:
+      self.send_error(400, str(e))
+
+  def end_headers(self):
+    # Allow show.html opened from disk to talk to the tap.
+    self.send_header('Access-Control-Allow-Origin', '*')
+    self.send_header('Access-Control-Expose-Headers', 'X-Frame-Start')
+    SimpleHTTPServer.SimpleHTTPRequestHandler.end_headers(self)
+
+  def translate_path(self, path):
+    path = posixpath.normpath(urllib.unquote(path.split('?', 1)[0]))
+    words = [word for word in path.split('/') if word not in ('', '.', '..')]
+    return os.path.join(self.STATIC_ROOT, *words)
+
+  def sendLayers(self):
+    tap = self.tap
+    first, end = tap.frameRange()
+    self.sendBody('application/json', json.dumps({
+      'layers': [{'width': w, 'height': h} for (w, h) in tap.layer_sizes],
+      'first': first,
+      'frames': end,
+    }))
+
+  def sendFrames(self, layer_num, kind, query):
+    tap = self.tap
+    if kind not in tap.KINDS:
+      raise ValueError('Unknown frame kind: ' + kind)
+    if not 0 <= layer_num < len(tap.layer_sizes):
+      raise IndexError('No layer ' + str(layer_num))
+    end = int(query.get('end', [tap.frameRange()[1]])[0])
+    start = int(query.get('start', [end - 1])[0])
+    start, body = tap.frames(layer_num, kind, start, end)
+    self.sendBody('application/octet-stream', body,
+                  {'X-Frame-Start': str(start)})
+
+  def sendStream(self):
+    tap = self.tap
+    self.send_response(200)
+    self.send_header('Content-Type', 'text/event-stream')
+    self.send_header('Cache-Control', 'no-cache')
+    self.end_headers()
+    recorded = 0
+    sent = None
+    while tap.server:
+      recorded = tap.waitForFrame(recorded)
+      index, frame = tap.latest()
+      if frame is None or index == sent:
+        continue
+      sent = index
+      data = json.dumps({
+        'frame': index,
+        'layers': [[base64.b64encode(actual), base64.b64encode(predicted)]
+                   for (actual, predicted) in frame]})
+      try:
+        self.wfile.write('event: frame\ndata: ' + data + '\n\n')
+        self.wfile.flush()
+      except IOError:
+        # Viewer went away.
+        return
+
+  def sendBody(self, content_type, body, headers=None):
+    self.send_response(200)
+    self.send_header('Content-Type', content_type)
+    self.send_header('Content-Length', str(len(body)))
+    for name, value in (headers or {}).items():
+      self.send_header(name, value)
+    self.end_headers()
+    self.wfile.write(body)
+
+  def log_message(self, format, *args):
+    # Keep the console for the brain.
+    pass
@@ -1,10 +1,33 @@
 import unittest
+import base64
+import httplib
 import numpy
 import json
 import os
+import random
+import shutil
+import tempfile
+import threading
 from src.brain import Brain
 from src.neuron import Neuron
 import src.util
+from src.distributed import DistributedBrain, ShardBrain, startLocalShards
+from src.checkpoint import Checkpointer, listCheckpoints, restore
+from src.lgn import LGN, readFrames
+from src.fovea import Fovea
+from src.paging import RegionStore
+from src.tap import StateTap
+
+
+def loadFrames(name):
+  """Return the input frames of a test case in data/json as nested lists."""
+  js = open(os.path.join('data', 'json', name, 'actual.js')).read()
+  # Remove JavaScript variable declaration and convert JSON.
+  return json.loads(js[js.index('=') + 1:].strip())
+
+def lineFrames():
+  """Return frames of a vertical line moving right, as numpy arrays."""
+  return [numpy.array(frame) for frame in loadFrames('lines')]
 
 
 class TestSimple(unittest.TestCase):
@@ -121,15 +144,420 @@ class TestSimple(unittest.TestCase):
 
   def getFrames(self, name):
     self.curr_test_name = name
-    js = open(os.path.join('data', 'json', name, 'actual.js')).read()
-    # Remove JavaScript variable declaration and convert JSON.
-    return json.loads(js[js.index('=') + 1:].strip())
+    return loadFrames(name)
 
   def tearDown(self):
     # Restore class level parameters we changed.
     Neuron.PREDICTIVE_CONNECTION_THRESHOLD = self.ORIGINAL_NEURON_CONNECTION_THRESHOLD
     Neuron.SIBLING_LOCALITY_DISTANCE = self.ORIGINAL_NEURON_LOCALITY_DISTANCE
 
+
+class StrengthOnlyTestCase(unittest.TestCase):
+  """
+  Counts connection strength alone, ignoring neighbor potential, so that
+  neurons actually get predicted and potentials build up.
+  """
+  def setUp(self):
+    self.ORIGINAL_INTENSITY_BOOST = Neuron.intensityBoost
+    Neuron.intensityBoost = lambda neuron, connection: 1
+
+  def tearDown(self):
+    Neuron.intensityBoost = self.ORIGINAL_INTENSITY_BOOST
+
+
+class TestFrameMemo(StrengthOnlyTestCase):
+  def testPredictOncePerFrame(self):
+    frames = lineFrames()
+    b = Brain(num_layers=1, neurons_in_leaf_layer=256)
+    layer = b.layers[0]
+    for frame in frames:
+      b.perceive(frame, learn=True)
+    # Learning resets potential, so look at a frame without it.
+    b.perceive(frames[0], learn=False)
+    potentials = [neuron.potential for neuron in layer.neurons.flat]
+    self.assertTrue(any(potentials))
+    prediction = layer.predict()
+    self.assertTrue(prediction is layer.predict())
+    self.assertFalse(prediction.flags.writeable)
+    self.assertEqual(potentials, [neuron.potential for neuron in layer.neurons.flat])
+    self.assertTrue(layer.state() is layer.state())
+    self.assertEqual(layer.state().tolist(), frames[0].tolist())
+
+    b.perceive(frames[1], learn=False)
+    self.assertFalse(prediction is layer.predict())
+    self.assertEqual(layer.state().tolist(), frames[1].tolist())
+
+class TestDistributed(StrengthOnlyTestCase):
+  def setUp(self):
+    StrengthOnlyTestCase.setUp(self)
+    # Small neighborhoods so a 16 x 16 brain splits into several shards.
+    self.ORIGINAL_SIBLING_LOCALITY_DISTANCE = Neuron.SIBLING_LOCALITY_DISTANCE
+    Neuron.SIBLING_LOCALITY_DISTANCE = 3
+
+  def tearDown(self):
+    Neuron.SIBLING_LOCALITY_DISTANCE = self.ORIGINAL_SIBLING_LOCALITY_DISTANCE
+    StrengthOnlyTestCase.tearDown(self)
+
+  def testMatchesSingleProcess(self):
+    frames = lineFrames()
+    learn = [True] * len(frames) + [False] * len(frames)
+    frames = frames + frames
+
+    # One shard holding every row, in this process.
+    random.seed(0)
+    brain = ShardBrain(num_layers=2, neurons_in_leaf_layer=256, rows=(0, 16))
+    expected = []
+    for (frame, should_learn) in zip(frames, learn):
+      brain.perceive(frame, learn=should_learn)
+      expected.append([(layer.state(), layer.predict()) for layer in brain.layers])
+    self.assertTrue(any(layers[0][1].any() for layers in expected))
+
+    random.seed(0)
+    addresses, processes = startLocalShards(3, authkey='test')
+    distributed = DistributedBrain(num_layers=2, neurons_in_leaf_layer=256,
+                                   addresses=addresses, authkey='test')
+    try:
+      for (frame, should_learn, layers) in zip(frames, learn, expected):
+        distributed.perceive(frame, learn=should_learn)
+        for (layer_num, (state, prediction)) in enumerate(layers):
+          self.assertTrue((distributed.state(layer_num) == state).all())
+          self.assertTrue((distributed.predict(layer_num) == prediction).all())
+    finally:
+      distributed.close()
+      for process in processes:
+        process.join()
+
+class TestCheckpoint(unittest.TestCase):
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def snapshot(self, brain):
+    return [(neuron.is_on, neuron.last_on,
+             [connection.strength for connection in neuron.sibling_connections],
+             [sorted(c.neighbor.coordinates() for c in strong)
+              for strong in neuron.strong_sibling_connections])
+            for layer in brain.layers for neuron in layer.neurons.flat]
+
+  def testRestoreToFrame(self):
+    brain = Brain(num_layers=1, neurons_in_leaf_layer=16)
+    checkpointer = Checkpointer(brain, self.directory)
+    checkpointer.DELTAS_PER_BASE = 3
+    snapshots = {}
+    for (i, x) in enumerate([0, 1, 2, 3, 0, 1, 2, 3]):
+      frame = numpy.zeros((4, 4), dtype=numpy.int32)
+      frame[:, x] = 1
+      brain.perceive(frame, learn=True)
+      snapshots[brain.frame] = self.snapshot(brain)
+    self.assertTrue(('base', 4) in [(kind, f) for (f, kind) in listCheckpoints(self.directory)])
+
+    self.assertNotEqual(snapshots[2], snapshots[6])
+    self.assertEqual(restore(brain, self.directory, 6), 6)
+    self.assertEqual(brain.frame, 6)
+    self.assertEqual(self.snapshot(brain), snapshots[6])
+    self.assertEqual(restore(brain, self.directory, 2), 2)
+    self.assertEqual(self.snapshot(brain), snapshots[2])
+
+  def testRestoreThenContinue(self):
+    brain = Brain(num_layers=1, neurons_in_leaf_layer=16)
+    checkpointer = Checkpointer(brain, self.directory)
+    checkpointer.DELTAS_PER_BASE = 3
+    def perceive(columns):
+      for x in columns:
+        frame = numpy.zeros((4, 4), dtype=numpy.int32)
+        frame[:, x] = 1
+        brain.perceive(frame, learn=True)
+        snapshots[brain.frame] = self.snapshot(brain)
+
+    snapshots = {}
+    perceive([0, 1, 2, 3, 0, 1, 2, 3])
+    self.assertEqual(checkpointer.restore(2), 2)
+    self.assertEqual(self.snapshot(brain), snapshots[2])
+    self.assertEqual(max(listCheckpoints(self.directory)), (2, 'delta'))
+
+    # A different future from frame 2.
+    perceive([3, 3, 2, 2, 1])
+    for frame in xrange(1, 8):
+      restored = Brain(num_layers=1, neurons_in_leaf_layer=16)
+      self.assertEqual(restore(restored, self.directory, frame), frame)
+      self.assertEqual(self.snapshot(restored), snapshots[frame])
+    self.assertEqual(max(listCheckpoints(self.directory))[0], 7)
+
+class TestLGN(unittest.TestCase):
+  def testChannels(self):
+    lgn = LGN(width=16, height=16)
+    frames = list(readFrames(os.path.join('data', 'images', 'lines')))
+    self.assertEqual(len(frames), 13)
+
+    intensity, edges, uniform, motion = lgn.process(frames[0])
+    # The line is the only dark thing in the image.
+    self.assertEqual(intensity.tolist(), lineFrames()[0].tolist())
+    self.assertTrue(edges.any())
+    self.assertFalse(motion.any()) # Nothing to compare the first frame with.
+    intensity, edges, uniform, motion = lgn.process(frames[1])
+    self.assertTrue(motion.any())
+    for channel in (edges, uniform, motion):
+      self.assertTrue(channel.sum() <= LGN.SATURATED_FRACTION * channel.size)
+
+  def testNoFlicker(self):
+    lgn = LGN(width=16, height=16)
+    uncapped = LGN(width=16, height=16)
+    uncapped.MAX_ACTIVE_FRACTION = 1.0
+    edges, uniform, motion = [LGN.CHANNELS.index(name)
+                              for name in ('edges', 'uniform', 'motion')]
+    previous = previous_full = None
+    for frame in readFrames(os.path.join('data', 'images', 'lines')):
+      channels = lgn.process(frame)
+      full = uncapped.process(frame)
+      # The moving line is never truncated.
+      for i in (edges, motion):
+        self.assertEqual(channels[i].tolist(), full[i].tolist())
+      self.assertTrue(channels[uniform].sum() <=
+                      LGN.SATURATED_FRACTION * channels[uniform].size)
+      if previous is not None:
+        # Background that stays uniform looks the same in both frames.
+        static = (full[uniform] & previous_full[uniform]).astype(bool)
+        self.assertEqual(channels[uniform][static].tolist(),
+                         previous[uniform][static].tolist())
+      previous, previous_full = channels, full
+
+    # A static scene gives identical channel maps.
+    self.assertEqual(lgn.process(frame)[:3].tolist(), channels[:3].tolist())
+    self.assertFalse(lgn.process(frame)[motion].any())
+
+  def testFeedBrain(self):
+    lgn = LGN(width=4, height=4)
+    brain = Brain(num_layers=1, neurons_in_leaf_layer=lgn.neurons)
+    frames = [numpy.random.rand(48, 64) for _ in range(3)]
+    lgn.feed(brain, frames, learn=True)
+    self.assertEqual(brain.frame, 3)
+    self.assertEqual(brain.layers[0].state().shape, (8, 8))
+
+class TestFovea(unittest.TestCase):
+  def testSampling(self):
+    fovea = Fovea(side=16, fovea_radius=4, input_width=200, input_height=200)
+    signal = numpy.zeros((200, 200), dtype=numpy.int32)
+    signal[100, 100] = 1
+    signal[0, 0] = 1
+    leaf = fovea.sample(signal)
+    self.assertEqual(leaf.shape, (16, 16))
+    # The center is sampled one to one and the periphery reaches the corners.
+    self.assertEqual(leaf[7:10, 7:10].sum(), 1)
+    self.assertEqual(leaf[8, 8], 1)
+    self.assertEqual(leaf[0, 0], 1)
+
+    fovea.attend(20, 30)
+    signal[:] = 0
+    signal[20, 30] = signal[21, 30] = 1
+    leaf = fovea.sample(signal)
+    self.assertEqual(leaf.sum(), 2)
+    self.assertEqual(leaf[7:10, 7:10].sum(), 2)
+
+  def testBrainWithFovea(self):
+    fovea = Fovea(side=4, fovea_radius=1, input_width=32, input_height=32)
+    brain = Brain(num_layers=1, neurons_in_leaf_layer=fovea.neurons, fovea=fovea)
+    signal = numpy.zeros((32, 32), dtype=numpy.int32)
+    signal[16, 16] = 1
+    brain.perceive(signal, learn=True)
+    self.assertEqual(brain.layers[0].state().tolist(), fovea.sample(signal).tolist())
+
+class TestPaging(StrengthOnlyTestCase):
+  def setUp(self):
+    StrengthOnlyTestCase.setUp(self)
+    self.directory = tempfile.mkdtemp()
+    self.ORIGINAL_SIBLING_LOCALITY_DISTANCE = Neuron.SIBLING_LOCALITY_DISTANCE
+    Neuron.SIBLING_LOCALITY_DISTANCE = 2
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+    Neuron.SIBLING_LOCALITY_DISTANCE = self.ORIGINAL_SIBLING_LOCALITY_DISTANCE
+    StrengthOnlyTestCase.tearDown(self)
+
+  def testMatchesInMemory(self):
+    frames = lineFrames()
+    frames = frames + frames
+    store = RegionStore(self.directory, region_side=4, max_regions=4)
+    brains = [Brain(num_layers=1, neurons_in_leaf_layer=256),
+              Brain(num_layers=1, neurons_in_leaf_layer=256, store=store)]
+    for frame in frames:
+      for brain in brains:
+        brain.perceive(frame, learn=True)
+      self.assertEqual(brains[0].layers[0].predict().tolist(),
+                       brains[1].layers[0].predict().tolist())
+
+    strengths = [[c.strength for n in brain.layers[0].neurons.flat
+                  for c in n.sibling_connections] for brain in brains]
+    self.assertEqual(strengths[0], strengths[1])
+    self.assertTrue(any(strengths[0]))
+    strong = [[sorted(c.neighbor.coordinates() for c in delay)
+               for n in brain.layers[0].neurons.flat
+               for delay in n.strong_sibling_connections] for brain in brains]
+    self.assertEqual(strong[0], strong[1])
+    # Paged neurons keep no connections of their own.
+    self.assertFalse('sibling_connections' in vars(brains[1].layers[0].neurons[0, 0]))
+    self.assertTrue(store.misses and store.evictions and store.writebacks)
+    self.assertTrue(0 < store.hitRate() < 1)
+
+class TestPredictionCache(StrengthOnlyTestCase):
+  def perceiveAll(self, brain, frames, learn):
+    results = []
+    for (frame, l) in zip(frames, learn):
+      brain.perceive(frame, learn=l)
+      results.append([(layer.state().copy(), layer.predict().copy(),
+                       [neuron.potential for neuron in layer.neurons.flat])
+                      for layer in brain.layers])
+    return results
+
+  def testMatchesUncached(self):
+    frames = lineFrames()
+    learn = [True] * len(frames) + [False] * len(frames) + [True] * len(frames)
+    frames = frames * 3
+
+    random.seed(0)
+    uncached = Brain(num_layers=2, neurons_in_leaf_layer=256)
+    for layer in uncached.layers:
+      layer.prediction_cache = None
+    expected = self.perceiveAll(uncached, frames, learn)
+
+    random.seed(0)
+    cached = Brain(num_layers=2, neurons_in_leaf_layer=256)
+    actual = self.perceiveAll(cached, frames, learn)
+
+    self.assertTrue(any(predicted.any() for result in expected
+                        for (_, predicted, _) in result))
+    for (expected_layers, actual_layers) in zip(expected, actual):
+      for ((state, predicted, potentials),
+           (cached_state, cached_predicted, cached_potentials)) in zip(
+             expected_layers, actual_layers):
+        self.assertTrue((state == cached_state).all())
+        self.assertTrue((predicted == cached_predicted).all())
+        self.assertEqual(potentials, cached_potentials)
+
+  def testHitsOnRepeatedInput(self):
+    Neuron.intensityBoost = self.ORIGINAL_INTENSITY_BOOST
+    frames = lineFrames()
+    brain = Brain(num_layers=2, neurons_in_leaf_layer=256)
+    for frame in frames:
+      brain.perceive(frame, learn=True)
+    cache = brain.layers[0].prediction_cache
+    self.assertEqual(cache.hits + cache.misses, 0)
+    for _ in xrange(4):
+      for frame in frames:
+        brain.perceive(frame, learn=False)
+    self.assertTrue(cache.hitRate() > 0.5)
+    self.assertTrue(len(cache.entries) <= brain.layers[0].PREDICTION_CACHE_SIZE)
+
+    brain.layers[0].neurons[0, 0].is_on = True
+    brain.layers[0].neurons[0, 0].predicted = False
+    brain.layers[0].learn()
+    self.assertEqual(len(cache.entries), 0)
+
+class TestSnapshot(unittest.TestCase):
+  def testConsistentWhilePerceiving(self):
+    frames = lineFrames()
+    brain = Brain(num_layers=2, neurons_in_leaf_layer=256)
+    self.assertEqual(brain.snapshot(), ())
+
+    seen = []
+    done = threading.Event()
+    def read():
+      while not done.is_set():
+        snapshot = brain.snapshot()
+        if snapshot and not (seen and seen[-1] is snapshot):
+          seen.append(snapshot)
+    reader = threading.Thread(target=read)
+    reader.start()
+    expected = {}
+    try:
+      for _ in xrange(3):
+        for frame in frames:
+          brain.perceive(frame, learn=True)
+          expected[brain.frame] = [layer.state().copy()
+                                   for layer in brain.layers]
+    finally:
+      done.set()
+      reader.join()
+
+    self.assertTrue(seen)
+    for snapshot in seen:
+      self.assertEqual(len(set(layer.frame for layer in snapshot)), 1)
+      for (layer, state) in zip(snapshot, expected[snapshot[0].frame]):
+        self.assertTrue((layer.state == state).all())
+        self.assertFalse(layer.state.flags.writeable)
+        self.assertFalse(layer.predicted.flags.writeable)
+        # Nothing subscribed to history.
+        self.assertTrue(layer.last_on is None and layer.potential is None)
+
+  def testSnapshotIsNotOverwritten(self):
+    brain = Brain(num_layers=1, neurons_in_leaf_layer=16)
+    brain.subscribe()
+    frame = numpy.zeros((4, 4), dtype=numpy.int32)
+    frame[1, 1] = 1
+    brain.perceive(frame, learn=True)
+    snapshot = brain.layers[0].snapshot()
+    self.assertTrue(snapshot is brain.snapshot()[0])
+    self.assertEqual(snapshot.frame, 1)
+    self.assertEqual(snapshot.state[1, 1], 1)
+
+    brain.perceive(numpy.zeros((4, 4), dtype=numpy.int32), learn=True)
+    self.assertEqual(snapshot.state[1, 1], 1)
+    self.assertEqual(snapshot.last_on[1, 1], 0)
+    self.assertEqual(brain.layers[0].snapshot().state[1, 1], 0)
+    self.assertEqual(brain.layers[0].snapshot().last_on[1, 1], 1)
+
+class TestTap(unittest.TestCase):
+  def setUp(self):
+    self.brain = Brain(num_layers=1, neurons_in_leaf_layer=256)
+    self.tap = StateTap(self.brain, port=0)
+    self.brain.attach(self.tap)
+    self.tap.start()
+    self.port = self.tap.server.server_address[1]
+
+  def tearDown(self):
+    self.tap.stop()
+    # Let request threads see the tap stop before the interpreter exits.
+    for thread in threading.enumerate():
+      if thread is not threading.current_thread():
+        thread.join(1)
+
+  def get(self, path):
+    connection = httplib.HTTPConnection('localhost', self.port, timeout=10)
+    connection.request('GET', path)
+    return connection.getresponse()
+
+  def testServesFrames(self):
+    frames = lineFrames()
+    states = {}
+    for frame in frames:
+      self.brain.perceive(frame, learn=True)
+      states[self.brain.frame] = self.brain.layers[0].state().copy()
+
+    layers = json.loads(self.get('/layers').read())
+    self.assertEqual(layers['layers'], [{'width': 16, 'height': 16}])
+    self.assertEqual(layers['first'], 1)
+    self.assertEqual(layers['frames'], len(frames) + 1)
+
+    response = self.get('/frames/0/actual?start=2&end=4')
+    self.assertEqual(response.getheader('X-Frame-Start'), '2')
+    body = response.read()
+    self.assertEqual(body, ''.join(
+      numpy.packbits(states[i].astype(numpy.uint8)).tostring()
+      for i in (2, 3)))
+
+    response = self.get('/stream')
+    self.assertEqual(response.getheader('Content-Type'), 'text/event-stream')
+    self.assertEqual(response.fp.readline(), 'event: frame\n')
+    data = response.fp.readline()
+    self.assertTrue(data.startswith('data: '))
+    event = json.loads(data[len('data: '):])
+    self.assertEqual(event['frame'], self.brain.frame)
+    self.assertEqual(base64.b64decode(event['layers'][0][0]),
+                     numpy.packbits(states[self.brain.frame].astype(
+                       numpy.uint8)).tostring())
+    response.close()
+
 if __name__ == '__main__':
   import cProfile
   cProfile.run("unittest.main()")
\ No newline at end of file